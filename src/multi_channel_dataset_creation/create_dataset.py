@@ -6,14 +6,10 @@ currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentfram
 sys.path.insert(0, currentdir)
 
 
-import parse_ini
-import create_patches
-import create_txt_files
-import move_data_to_separate_folders
+# the pipeline steps are imported in the branches that run them, skipped steps do not pay for importing rasterio, gdal and geopandas
 import argparse
 import time
 import configparser
-import geopackage_to_label_v2
 
 def main(args):
     create_dataset_start_time = time.time()
@@ -22,6 +18,7 @@ def main(args):
         print("move_data_to_separate_folders")
         print("#######################################")
         #going from folder/a_name_DSM.tif , folder/a_name_OrtoCIR.tif ... to  DSM/a_name.tif , OrtoCIR/a_name.tif ..
+        import move_data_to_separate_folders
         move_data_to_separate_folders.main(args = args)
     
 
@@ -30,6 +27,8 @@ def main(args):
         print("create_labels")
         print("#######################################")
         #convert the geopackage polygons to label images of same shape as the 'lod-images'
+        import parse_ini
+        import geopackage_to_label_v2
         parsed_ini_file = parse_ini.parse(args.dataset_config) # aprse the .ini file 
         geopackage_to_label_v2.process_label_generation_main( geopackage = parsed_ini_file["geopackage"],  
             input_folder=parsed_ini_file["images_that_define_areas_to_create_labels_for"], 
@@ -47,6 +46,7 @@ def main(args):
     print("create_patches") #splitting input data and label data can be stopped by including create_patches and split_labels in args.skip
     print("#######################################")
     #split the data and label-images up into smaler pathces e.g 1000x1000
+    import create_patches
     create_patches.main(config=args.dataset_config,skip = args.skip)
 
     if not "create_text_files" in args.skip:
@@ -54,6 +54,7 @@ def main(args):
         print("create_text_files")
         print("#######################################")
         #divide the dataset into trainingset and validationset and save the split as all.txt, train.txt and valid.txt
+        import create_txt_files
         create_txt_files.main(config=args.dataset_config)
 
     create_dataset_end_time = time.time()
@@ -1,72 +1,110 @@
 import os
 import pathlib
+import numpy as np
 import rasterio
 from rasterio.windows import Window
-from osgeo import ogr
+from rasterio.transform import rowcol, xy
+from osgeo import gdal, ogr
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import gdal_settings
 
-def main(inputfolder, outputfolder,shapefile_path,extra_boarder=50, replacestring="", newstring="", only_consider_files_with_matching_names=False):
+
+def _get_shapefile_extent(shapefile_path):
+    shape_ds = ogr.Open(str(shapefile_path))
+    layer = shape_ds.GetLayer()
+    return layer.GetExtent()
+
+
+def _crop_file(input_path, output_path, extra_boarder, extent):
+    with gdal_settings.worker_env():
+        main_crop_geotiff(geotiff_path=input_path, shapefile_path=None, output_path=output_path, extra_boarder=extra_boarder, extent=extent)
+
+
+def main(inputfolder, outputfolder,shapefile_path,extra_boarder=50, replacestring="", newstring="", only_consider_files_with_matching_names=False, max_workers=None):
+    """
+    Crop all files in inputfolder to the extent of the shapefile (plus extra_boarder).
+    The files are independent of each other and are cropped in parallel by max_workers processes (default: os.cpu_count())
+    """
     if pathlib.Path(inputfolder).exists():
         files = os.listdir(inputfolder)
         files.sort()
     else:
         files =[]
-    for (index, file) in enumerate(files):
-        print("working on file :" + str(index) + " out of :" + str(len(files)))
+    jobs = []
+    for file in files:
+        if only_consider_files_with_matching_names and replacestring not in file:
+            continue
         input_path = pathlib.Path(inputfolder) / pathlib.Path(file)
         output_path = pathlib.Path(outputfolder) / pathlib.Path(file.replace(replacestring, newstring))
-        if only_consider_files_with_matching_names and replacestring not in file:
-            pass
-        else:
-            if True:#try:
-                main_crop_geotiff(geotiff_path=input_path, shapefile_path=shapefile_path, output_path=output_path,extra_boarder=extra_boarder)
-            else:#except:
-                print("##############################################failed to crop iamge:"+str(input_path))
-
+        jobs.append((input_path, output_path))
+    if not jobs:
+        return
+
+    # The shapefile is the same for all files, read its extent once
+    extent = _get_shapefile_extent(shapefile_path)
+    max_workers = max_workers or os.cpu_count()
+    threads, cache_mb = gdal_settings.worker_resources(max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=gdal_settings.init_worker, initargs=(threads, cache_mb)) as executor:
+        futures = {executor.submit(_crop_file, input_path, output_path, extra_boarder, extent): input_path for (input_path, output_path) in jobs}
+        for (index, future) in enumerate(as_completed(futures)):
+            future.result()
+            print("done with file :" + str(index + 1) + " out of :" + str(len(jobs)) + " (" + str(futures[future]) + ")")
 
 import rasterio
 from rasterio.windows import from_bounds
 
 
 
-def crop_geotiff(input_path, output_path, bounding_box):
-    print("croping image:"+str(input_path)+ " to "+str(output_path))
-    with rasterio.open(input_path) as src:
-        # Create a window based on the bounding box
-        window = from_bounds(bounding_box[0], bounding_box[2], bounding_box[1], bounding_box[3], src.transform)
+def crop_window_is_inside(src, output_path, bounding_box):
+    """
+    Check that bounding_box ([xmin, xmax, ymin, ymax]) lies inside the already opened raster.
+    If it does not, the output file is deleted and False is returned
+    """
+    print("croping image:"+str(src.name)+ " to "+str(output_path))
+    # Create a window based on the bounding box
+    window = from_bounds(bounding_box[0], bounding_box[2], bounding_box[1], bounding_box[3], src.transform)
 
-        if (window.col_off < 0 or window.row_off < 0 or
-            window.col_off + window.width > src.width or
-            window.row_off + window.height > src.height):
-            input("Window is out of bounds for the input raster., now making sure that the outut file is deletet (if input and outputfile is the same we need to delete it , otherwise we could keep the original)")
-            pathlib.Path(output_path).unlink(missing_ok=True)
+    if (window.col_off < 0 or window.row_off < 0 or
+        window.col_off + window.width > src.width or
+        window.row_off + window.height > src.height):
+        # print instead of input(), the crop can be running in a worker process without a stdin
+        print("Window is out of bounds for the input raster., now making sure that the outut file is deletet (if input and outputfile is the same we need to delete it , otherwise we could keep the original)")
+        pathlib.Path(output_path).unlink(missing_ok=True)
+        return False
+    return True
 
-        try:
-            # Read the data within the window
-            data = src.read(window=window)
-        except:
-            print("failed to crop :"+str(input_path))
-            print("making sure the output file is deleted in case input and output is the same")
-            pathlib.Path(output_path).unlink(missing_ok=True)
-            return
-        # Update the transform for the new window
-        window_transform = src.window_transform(window)
-
-        # Update the metadata
-        meta = src.meta
-        meta.update({
-            'driver': 'GTiff',
-            'height': window.height,
-            'width': window.width,
-            'transform': window_transform
-        })
 
+def crop_geotiff(input_path, output_path, bounding_box):
+    """
+    Crop input_path to bounding_box ([xmin, xmax, ymin, ymax]) with gdal.Translate, the pixels are copied by GDAL without passing through python.
+    Must be called after the input raster is closed, since input_path and output_path can be the same file
+    """
     # Write the cropped GeoTIFF to a tmp file before moving it to the destination (this fixes an issie with rasterio if input path and output path are identical)
     # Create a new path by adding 'tmp_' to the file name
     tmp_path = pathlib.Path(input_path).with_name('tmp_' + pathlib.Path(input_path).name)
-    with rasterio.open(tmp_path, 'w', **meta) as dst:
-        dst.write(data)
+    try:
+        cropped = gdal.Translate(
+            str(tmp_path),
+            str(input_path),
+            format="GTiff",
+            projWin=[bounding_box[0], bounding_box[3], bounding_box[1], bounding_box[2]],
+            # compressed on this worker's share of the cpus
+            creationOptions=["TILED=YES", "COMPRESS=DEFLATE", f"NUM_THREADS={gdal_settings.worker_threads()}", "BIGTIFF=IF_SAFER"],
+        )
+    except RuntimeError as e:
+        # raised instead of returning None when gdal exceptions are enabled (see gdal_settings.init_worker)
+        print(e)
+        cropped = None
+    if cropped is None:
+        print("failed to crop :"+str(input_path))
+        print("making sure the output file is deleted in case input and output is the same")
+        pathlib.Path(output_path).unlink(missing_ok=True)
+        pathlib.Path(tmp_path).unlink(missing_ok=True)
+        return
+    # Closing the dataset flushes it to disk
+    cropped = None
     # Move the file to the new location
     pathlib.Path(tmp_path).rename(output_path)
 
@@ -96,13 +134,14 @@ def crop_geotiff(input_path, output_path, bounding_box):
         with rasterio.open(output_path, 'w', **meta) as dst:
             dst.write(data)
 """
-def main_crop_geotiff(geotiff_path, shapefile_path, output_path,extra_boarder):
-    # Open the shapefile to get the bounding box
-    shape_ds = ogr.Open(shapefile_path)
-    layer = shape_ds.GetLayer()
-    extent = layer.GetExtent()
-    with rasterio.open(geotiff_path) as openedfile:
-        original_bounds = openedfile.bounds
+def main_crop_geotiff(geotiff_path, shapefile_path, output_path,extra_boarder, extent=None):
+    if extent is None:
+        # Open the shapefile to get the bounding box
+        extent = _get_shapefile_extent(shapefile_path)
+    crop_box = None
+    # The GeoTIFF is opened once, bounds, transform and the crop window are all taken from the same handle
+    with rasterio.open(geotiff_path) as src:
+        original_bounds = src.bounds
         # get the bounds of the shapefile
         xmin, xmax, ymin, ymax = extent
 
@@ -125,34 +164,37 @@ def main_crop_geotiff(geotiff_path, shapefile_path, output_path,extra_boarder):
         print("original image :" + str(original_bounds))
         print("rasterio version: " + str([xmin, xmax, ymin, ymax]))
 
-        # Calculate the pixel coordinates of the bounding box
-    with rasterio.open(geotiff_path) as src:
+        # Calculate the pixel coordinates of the bounding box (both corners in one call, truncated like int()).
+        # Newer rasterio versions only accept numpy ufuncs as op
+        rows, cols = rowcol(src.transform, [xmin, xmax], [ymin, ymax], op=np.trunc)
+        ymin_pixel, ymax_pixel = (int(row) for row in rows)
+        xmin_pixel, xmax_pixel = (int(col) for col in cols)
 
 
-        xmin_pixel, ymin_pixel = map(int, ~src.transform * (xmin, ymin))
-        xmax_pixel, ymax_pixel = map(int, ~src.transform * (xmax, ymax))
+        # Get the geographic coordinates of the adjusted bounding box (upper left corner of the pixels)
+        (xmin_adj, xmax_adj), (ymin_adj, ymax_adj) = xy(src.transform, [ymin_pixel, ymax_pixel], [xmin_pixel, xmax_pixel], offset="ul")
 
+        print("Adjusted bounding box in pixels: ", [xmin_pixel, xmax_pixel, ymin_pixel, ymax_pixel])
+        print("Adjusted bounding box in geographic coordinates: ", [xmin_adj, xmax_adj, ymin_adj, ymax_adj])
+        print("min([xmax_pixel-xmin_pixel,ymax_pixel-ymin_pixel]):"+str(min([xmax_pixel-xmin_pixel,ymax_pixel-ymin_pixel])))
+        print("[xmin_pixel, xmax_pixel, ymin_pixel, ymax_pixel]:"+str([xmin_pixel, xmax_pixel, ymin_pixel, ymax_pixel]))
+        print("min([xmax_pixel-xmin_pixel, ymin_pixel- ymax_pixel]):"+str(min([xmax_pixel-xmin_pixel, ymin_pixel- ymax_pixel])))
 
-        # Get the geographic coordinates of the adjusted bounding box
-        xmin_adj, ymin_adj = src.transform * (xmin_pixel, ymin_pixel)
-        xmax_adj, ymax_adj = src.transform * (xmax_pixel, ymax_pixel)
+        if min([xmin_pixel, xmax_pixel, ymin_pixel, ymax_pixel])<0:
+            print("output image would have become negative size")
+            pathlib.Path(output_path).unlink(missing_ok=True)
 
-    print("Adjusted bounding box in pixels: ", [xmin_pixel, xmax_pixel, ymin_pixel, ymax_pixel])
-    print("Adjusted bounding box in geographic coordinates: ", [xmin_adj, xmax_adj, ymin_adj, ymax_adj])
-    print("min([xmax_pixel-xmin_pixel,ymax_pixel-ymin_pixel]):"+str(min([xmax_pixel-xmin_pixel,ymax_pixel-ymin_pixel])))
-    print("[xmin_pixel, xmax_pixel, ymin_pixel, ymax_pixel]:"+str([xmin_pixel, xmax_pixel, ymin_pixel, ymax_pixel]))
-    print("min([xmax_pixel-xmin_pixel, ymin_pixel- ymax_pixel]):"+str(min([xmax_pixel-xmin_pixel, ymin_pixel- ymax_pixel])))
+        elif min([xmax_pixel-xmin_pixel, ymin_pixel- ymax_pixel]) <1010:
+            print("images smaller than 1010 are skipped, a better solution would be to enlarge them to be 1010")
+            pathlib.Path(output_path).unlink(missing_ok=True)
+        else:
+            # Crop the GeoTIFF using the adjusted bounding box
+            if crop_window_is_inside(src, output_path, [xmin_adj, xmax_adj, ymin_adj, ymax_adj]):
+                crop_box = [xmin_adj, xmax_adj, ymin_adj, ymax_adj]
 
-    if min([xmin_pixel, xmax_pixel, ymin_pixel, ymax_pixel])<0:
-        print("output image would have become negative size")
-        pathlib.Path(output_path).unlink(missing_ok=True)
-        
-    elif min([xmax_pixel-xmin_pixel, ymin_pixel- ymax_pixel]) <1010:
-        print("images smaller than 1010 are skipped, a better solution would be to enlarge them to be 1010")
-        pathlib.Path(output_path).unlink(missing_ok=True)
-    else:
-        # Crop the GeoTIFF using the adjusted bounding box
-        crop_geotiff(geotiff_path, output_path, [xmin_adj, xmax_adj, ymin_adj, ymax_adj])
+    # Cropped after the input is closed, input and output can be the same file
+    if crop_box is not None:
+        crop_geotiff(geotiff_path, output_path, crop_box)
 
 if __name__ == "__main__":
     import argparse
@@ -162,11 +204,13 @@ if __name__ == "__main__":
     parser.add_argument("--shapefile", required=True, help="Path to the shapefile.")
     parser.add_argument("--output", required=True, help="Path to output folder or the new GeoTIFF file")
     parser.add_argument("--extra_boarder",default = 50,type=int)
+    parser.add_argument("--workers",default = None,type=int, help="Number of processes used when cropping a folder (default: number of cpus)")
 
     args = parser.parse_args()
 
     if pathlib.Path(args.input).is_dir() and  pathlib.Path(args.output).is_dir():
-        main(inputfolder=args.input, outputfolder=args.output, replacestring="", newstring="", only_consider_files_with_matching_names=False, shapefile_path=args.shapefile,extra_boarder = args.extra_boarder)
+        main(inputfolder=args.input, outputfolder=args.output, replacestring="", newstring="", only_consider_files_with_matching_names=False, shapefile_path=args.shapefile,extra_boarder = args.extra_boarder, max_workers=args.workers)
     else:
-        main_crop_geotiff(args.input, args.shapefile, args.output,args.extra_boarder)
+        with gdal_settings.worker_env():
+            main_crop_geotiff(args.input, args.shapefile, args.output,args.extra_boarder)
 
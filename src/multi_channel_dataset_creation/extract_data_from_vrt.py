@@ -6,23 +6,40 @@ Extract data from VRT files for each tile in a shapefile and save as GeoTIFF fil
 import argparse
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import geopandas as gpd
 import rasterio
-from rasterio.warp import calculate_default_transform, reproject, Resampling
+from rasterio.warp import calculate_default_transform, Resampling
 from rasterio.windows import from_bounds
 from rasterio.mask import mask
+from osgeo import gdal
 import numpy as np
 from tqdm import tqdm
+import gdal_settings
 
 
-def extract_tile_data(vrt_path, tile_geometry, tile_name, output_folder, resolution):
+# VRT dataset opened once in every worker process by _init_worker
+_worker_vrt = None
+
+
+def _init_worker(vrt_path, threads, cache_mb):
+    global _worker_vrt
+    gdal_settings.init_worker(threads, cache_mb)
+    _worker_vrt = gdal.Open(vrt_path)
+
+
+def _extract_tile(tile_bounds, tile_name, output_folder, resolution):
+    return extract_tile_data(_worker_vrt, tile_bounds, tile_name, output_folder, resolution)
+
+
+def extract_tile_data(src, tile_bounds, tile_name, output_folder, resolution):
     """
-    Extract data from VRT for a single tile and save as GeoTIFF.
+    Extract data from an opened VRT for a single tile and save as GeoTIFF.
     
     Args:
-        vrt_path (str): Path to the VRT file
-        tile_geometry: Shapely geometry of the tile
+        src (gdal.Dataset): The opened VRT dataset
+        tile_bounds (tuple): Bounds of the tile (minx, miny, maxx, maxy)
         tile_name (str): Name for the output file (without extension)
         output_folder (str): Output directory path
         resolution (float): Target resolution in meters per pixel
@@ -31,42 +48,35 @@ def extract_tile_data(vrt_path, tile_geometry, tile_name, output_folder, resolut
         bool: True if successful, False otherwise
     """
     try:
-        with rasterio.open(vrt_path) as src:
-            # Get tile bounds
-            minx, miny, maxx, maxy = tile_geometry.bounds
-            
-            # Calculate output dimensions based on resolution
-            width = int((maxx - minx) / resolution)
-            height = int((maxy - miny) / resolution)
-            
-            # Create output transform
-            transform = rasterio.transform.from_bounds(minx, miny, maxx, maxy, width, height)
-            
-            # Create output profile
-            profile = src.profile.copy()
-            profile.update({
-                'height': height,
-                'width': width,
-                'transform': transform,
-                'crs': src.crs
-            })
-            
-            # Output file path
-            output_path = os.path.join(output_folder, f"{tile_name}.tiff")
-            
-            # Read and resample data
-            with rasterio.open(output_path, 'w', **profile) as dst:
-                for band_idx in range(1, src.count + 1):
-                    # Read data from source
-                    reproject(
-                        source=rasterio.band(src, band_idx),
-                        destination=rasterio.band(dst, band_idx),
-                        src_transform=src.transform,
-                        src_crs=src.crs,
-                        dst_transform=transform,
-                        dst_crs=src.crs,
-                        resampling=Resampling.bilinear
-                    )
+        # Get tile bounds
+        minx, miny, maxx, maxy = tile_bounds
+        
+        # Calculate output dimensions based on resolution
+        width = int((maxx - minx) / resolution)
+        height = int((maxy - miny) / resolution)
+        
+        # Output file path
+        output_path = os.path.join(output_folder, f"{tile_name}.tiff")
+        
+        # GDAL's C warper resamples all bands with threaded block IO, on this worker's share of the cpus.
+        # Parts of the tile outside the VRT are filled with nodata/0
+        num_threads = f"NUM_THREADS={gdal_settings.worker_threads()}"
+        dst = gdal.Warp(
+            output_path,
+            src,
+            format="GTiff",
+            outputBounds=(minx, miny, maxx, maxy),
+            width=width,
+            height=height,
+            resampleAlg="bilinear",
+            multithread=True,
+            warpOptions=[num_threads],
+            creationOptions=["TILED=YES", "BLOCKXSIZE=512", "BLOCKYSIZE=512", "COMPRESS=DEFLATE", num_threads, "BIGTIFF=IF_SAFER"]
+        )
+        if dst is None:
+            raise RuntimeError(gdal.GetLastErrorMsg())
+        # Closing the dataset flushes it to disk
+        dst = None
         
         return True
     
@@ -84,6 +94,8 @@ def main():
     parser.add_argument("--output_folder", required=True, help="Output folder for GeoTIFF files")
     parser.add_argument("--resolution", type=float, default=0.1, 
                        help="Resolution in meters per pixel (default: 0.1)")
+    parser.add_argument("--workers", type=int, default=None,
+                       help="Number of tiles processed in parallel (default: number of cpus)")
     
     args = parser.parse_args()
     
@@ -123,26 +135,30 @@ def main():
     successful = 0
     total_tiles = len(gdf)
     
-    for idx, row in gdf.iterrows():
-        # Get tile name - try common column names
-        tile_name = None
-        for col in ['location', 'name', 'id', 'tile_name', 'filename']:
-            if col in gdf.columns:
-                tile_name = str(row[col])
-                # Remove file extension if present
-                tile_name = os.path.splitext(tile_name)[0]
-                break
-        
-        if tile_name is None:
-            tile_name = f"tile_{idx:06d}"
-        
-        # Extract data for this tile
-        if extract_tile_data(args.vrt, row.geometry, tile_name, args.output_folder, args.resolution):
-            successful += 1
-        
-        # Print progress on same line
-        progress = (idx + 1) / total_tiles * 100
-        print(f"\rProgress: {progress:.1f}% ({idx + 1}/{total_tiles}) - {successful} successful", end="", flush=True)
+    # Pick the tile name column once and pull names and bounds out of the GeoDataFrame as whole columns
+    name_col = next((col for col in ['location', 'name', 'id', 'tile_name', 'filename'] if col in gdf.columns), None)
+    if name_col is not None:
+        # Remove file extension if present
+        tile_names = gdf[name_col].astype(str).map(lambda name: os.path.splitext(name)[0]).to_numpy()
+    else:
+        tile_names = [f"tile_{idx:06d}" for idx in gdf.index]
+    tile_bounds = gdf.geometry.bounds.to_numpy()
+    
+    # Tiles are independent, each worker process opens the VRT once and warps tiles from it
+    max_workers = args.workers or os.cpu_count()
+    threads, cache_mb = gdal_settings.worker_resources(max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(args.vrt, threads, cache_mb)) as executor:
+        futures = [
+            executor.submit(_extract_tile, tuple(tile_bounds[i]), tile_names[i], args.output_folder, args.resolution)
+            for i in range(total_tiles)
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            if future.result():
+                successful += 1
+            
+            # Print progress on same line
+            progress = done / total_tiles * 100
+            print(f"\rProgress: {progress:.1f}% ({done}/{total_tiles}) - {successful} successful", end="", flush=True)
     
     print(f"\n\nCompleted! Successfully processed {successful}/{total_tiles} tiles")
     
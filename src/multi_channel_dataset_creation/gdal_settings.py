@@ -0,0 +1,74 @@
+"""
+GDAL settings shared by the scripts that process many rasters in parallel worker processes (or threads).
+
+The main process splits the cpus and the GDAL block cache between the workers with worker_resources,
+each worker applies its share with init_worker (used as the pool initializer) and opens its rasters
+inside worker_env().
+init_worker changes process-wide GDAL settings and is only meant for pool worker processes. Code that
+runs in the main process uses worker_env() without init_worker, which scopes the settings to the block.
+"""
+import os
+import rasterio
+
+try:
+    # gdal.Translate/gdal.Warp users need the settings in the osgeo bindings as well
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+# GDAL settings for reading and writing many large GeoTIFFs
+GDAL_CONFIG = {
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(256 * 1024 * 1024),
+    # skip the directory listing GDAL does on every open, the input folders hold thousands of sibling files
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+}
+# GDAL block cache (MB) shared by all worker processes
+GDAL_CACHEMAX_MB = 2048
+
+# Share of this process, set by init_worker (the whole machine until then). rasterio.Env sets
+# GDAL_CACHEMAX for the whole process, so it is left out until init_worker sets it in a worker
+_worker_threads = os.cpu_count()
+_worker_config = dict(GDAL_CONFIG, GDAL_NUM_THREADS=str(_worker_threads))
+
+
+def worker_resources(max_workers):
+    """
+    Split the cpus and the GDAL block cache between max_workers worker processes.
+    Returns (threads per worker, block cache in MB per worker).
+    """
+    threads = max(os.cpu_count() // max_workers, 1)
+    cache_mb = max(GDAL_CACHEMAX_MB // max_workers, 64)
+    return threads, cache_mb
+
+
+def init_worker(threads, cache_mb):
+    """
+    Use threads cpus and cache_mb MB of GDAL block cache in this process (pool initializer).
+    The settings are given to the osgeo bindings right away (with exceptions enabled) and to rasterio
+    through worker_env, the two can be linked against separate GDAL libraries.
+    """
+    global _worker_threads, _worker_config
+    _worker_threads = threads
+    # rasterio.Env requires GDAL_CACHEMAX to be an int
+    _worker_config = dict(GDAL_CONFIG, GDAL_NUM_THREADS=str(threads), GDAL_CACHEMAX=cache_mb)
+    if gdal is not None:
+        gdal.UseExceptions()
+        for key, value in _worker_config.items():
+            gdal.SetConfigOption(key, str(value))
+
+
+def worker_threads():
+    """Number of threads this process may use, e.g. for NUM_THREADS creation and warp options."""
+    return _worker_threads
+
+
+def worker_env(threads=None, **options):
+    """
+    rasterio.Env with the GDAL settings of this process, plus any extra config options.
+    threads overrides the number of GDAL threads, e.g. for threads that share the process.
+    """
+    config = dict(_worker_config, **options)
+    if threads is not None:
+        config["GDAL_NUM_THREADS"] = str(threads)
+    return rasterio.Env(**config)
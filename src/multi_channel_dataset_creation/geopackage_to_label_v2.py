@@ -1,19 +1,212 @@
 import os
 import time
 import glob
+import itertools
 import logging
+import math
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 import geopandas as gpd
 import rasterio
+import rasterio.windows
 from rasterio.features import rasterize
+from rasterio.windows import Window
 import numpy as np
 import pandas as pd
-from scipy.ndimage import distance_transform_edt
+import numba
+from numba import njit, prange
 from shapely.geometry import box
 from typing import Tuple, Optional
+import gdal_settings
+
+try:
+    # OpenCV's SIMD distance transform is much faster than scipy's, scipy is only used as a fallback
+    import cv2
+except ImportError:
+    cv2 = None
+    from scipy.ndimage import distance_transform_edt
+
+try:
+    # Optional GPU path (use_gpu=True)
+    import cupy
+    from cucim.core.operations.morphology import distance_transform_edt as gpu_distance_transform_edt
+except ImportError:
+    cupy = None
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# Full-size scratch arrays reused between rasters, see _scratch_buffer
+_scratch_buffers = {}
+
+# Borders reaching at most this many pixels from the boundary use the integer 3-4 chamfer distance
+# (_chamfer_distance_u16), its error (about 6% at most) is a fraction of a pixel at these distances
+CHAMFER_MAX_DISTANCE = 5
+# The 3-4 chamfer distance counts 3 per axial step and 4 per diagonal step, i.e. in units of 1/3 pixel
+CHAMFER_UNITS_PER_PIXEL = 3
+
+# Rasters are labelled in windows of at most this many pixels per side (plus the overlap), which bounds
+# the memory of the label and scratch arrays independently of the raster size
+LABEL_WINDOW_SIZE = 4096
+
+if cupy is not None:
+    # True where a pixel differs from its N/S/W/E neighbour. Pixels on the edge of the image are
+    # only compared to the neighbours that exist, the same result as np.pad(mode="edge") + 4 diffs
+    _gpu_boundary_kernel = cupy.ElementwiseKernel(
+        "raw uint8 labels, int32 height, int32 width",
+        "bool boundary",
+        """
+        const ptrdiff_t row = i / width;
+        const ptrdiff_t col = i % width;
+        const unsigned char value = labels[i];
+        boundary = (row > 0 && labels[i - width] != value)
+                || (row < height - 1 && labels[i + width] != value)
+                || (col > 0 && labels[i - 1] != value)
+                || (col < width - 1 && labels[i + 1] != value);
+        """,
+        "label_boundary",
+    )
+
+
+@njit(parallel=True, cache=True, boundscheck=False)
+def _compute_interior(label, out):
+    """
+    Set out[i, j] (uint8) to 1 where label[i, j] equals all its N/S/W/E neighbours and to 0 on label boundaries,
+    in one pass without padding. Pixels on the edge of the image are only compared to the neighbours that exist
+    (same as np.pad(mode="edge")). This is the inverted boundary mask, which is what the distance transform takes.
+    """
+    height, width = label.shape
+    for i in prange(height):
+        for j in range(width):
+            c = label[i, j]
+            boundary = (
+                (i > 0 and label[i - 1, j] != c)
+                or (i < height - 1 and label[i + 1, j] != c)
+                or (j > 0 and label[i, j - 1] != c)
+                or (j < width - 1 and label[i, j + 1] != c)
+            )
+            out[i, j] = 0 if boundary else 1
+
+
+def _scratch_buffer(name: str, shape: Tuple[int, int], dtype) -> np.ndarray:
+    """
+    Scratch array of the given shape and dtype that is reused between rasters and windows (one per name and process).
+    The memory is only reallocated when a larger array is needed, smaller shapes (e.g. the windows on the
+    right and bottom edge of a raster) get a contiguous view of the existing buffer.
+    """
+    size = shape[0] * shape[1]
+    buffer = _scratch_buffers.get(name)
+    if buffer is None or buffer.size < size or buffer.dtype != dtype:
+        buffer = np.empty(size, dtype=dtype)
+        _scratch_buffers[name] = buffer
+    return buffer[:size].reshape(shape)
+
+
+def _pixel_border_width(unknown_border_size: float, transform: rasterio.transform.Affine) -> float:
+    """Width of the unknown border in pixels, using the mean of the x and y resolution of the transform."""
+    x_res = abs(transform.a)
+    y_res = abs(transform.e)
+    mean_res = (x_res + y_res) / 2
+    return unknown_border_size / mean_res
+
+
+def _label_windows(height: int, width: int, window_size: int, overlap: int):
+    """
+    Split a raster of shape (height, width) into windows of at most window_size pixels per side.
+    Yields (core_window, read_window) pairs: the core windows tile the raster without overlap and each
+    read window is its core window grown by overlap pixels on every side (clipped to the raster).
+    """
+    for row_off in range(0, height, window_size):
+        core_height = min(window_size, height - row_off)
+        read_row_off = max(row_off - overlap, 0)
+        read_row_end = min(row_off + core_height + overlap, height)
+        for col_off in range(0, width, window_size):
+            core_width = min(window_size, width - col_off)
+            read_col_off = max(col_off - overlap, 0)
+            read_col_end = min(col_off + core_width + overlap, width)
+            yield (
+                Window(col_off, row_off, core_width, core_height),
+                Window(read_col_off, read_row_off, read_col_end - read_col_off, read_row_end - read_row_off),
+            )
+
+
+@njit(cache=True, boundscheck=False)
+def _chamfer_distance_u16(interior, out):
+    """
+    3-4 chamfer distance from every pixel to the nearest zero in interior, written to the uint16 array out
+    in units of 1/3 pixel (saturating at 65535). Two raster scans, each pixel looks at its already visited neighbours.
+    """
+    height, width = interior.shape
+    far = 65535
+    # Forward pass: top-left to bottom-right
+    for i in range(height):
+        for j in range(width):
+            if interior[i, j] == 0:
+                out[i, j] = 0
+                continue
+            d = far
+            if i > 0:
+                d = min(d, out[i - 1, j] + 3)
+                if j > 0:
+                    d = min(d, out[i - 1, j - 1] + 4)
+                if j < width - 1:
+                    d = min(d, out[i - 1, j + 1] + 4)
+            if j > 0:
+                d = min(d, out[i, j - 1] + 3)
+            out[i, j] = min(d, far)
+    # Backward pass: bottom-right to top-left
+    for i in range(height - 1, -1, -1):
+        for j in range(width - 1, -1, -1):
+            d = int(out[i, j])
+            if d == 0:
+                continue
+            if i < height - 1:
+                d = min(d, out[i + 1, j] + 3)
+                if j > 0:
+                    d = min(d, out[i + 1, j - 1] + 4)
+                if j < width - 1:
+                    d = min(d, out[i + 1, j + 1] + 4)
+            if j < width - 1:
+                d = min(d, out[i, j + 1] + 3)
+            out[i, j] = d
+
+
+def distance_to_boundary(interior_mask: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Euclidean distance (in pixels) from every pixel to the nearest boundary pixel,
+    i.e. the nearest zero in the uint8 interior_mask from _compute_interior.
+
+    Uses cv2.distanceTransform (float32) when OpenCV is installed, otherwise
+    scipy.ndimage.distance_transform_edt (float64).
+    out is an optional float32 array the OpenCV result is written to.
+    """
+    if cv2 is not None:
+        return cv2.distanceTransform(
+            interior_mask,
+            distanceType=cv2.DIST_L2,
+            maskSize=cv2.DIST_MASK_PRECISE,
+            dst=out,
+            dstType=cv2.CV_32F,
+        )
+    return distance_transform_edt(interior_mask)
+
+
+def apply_border_gpu(label_array: np.ndarray, pixel_border_width: float, ignore_value: int) -> np.ndarray:
+    """
+    GPU version of the border step: sets all pixels closer than pixel_border_width/2 to a label boundary to ignore_value.
+    Boundary detection is a single elementwise kernel and the distance transform is cuCIM's.
+    The result is copied back into label_array, which is returned.
+    """
+    d_label = cupy.asarray(label_array)
+    height, width = d_label.shape
+    boundary_mask = cupy.empty(d_label.shape, dtype=cupy.bool_)
+    _gpu_boundary_kernel(d_label, np.int32(height), np.int32(width), boundary_mask)
+    # cuCIM's default block parameters fail on images with a side larger than 1024 pixels
+    block_params = (1, 32, 2) if max(height, width) > 1024 else None
+    dt_map = gpu_distance_transform_edt(~boundary_mask, block_params=block_params)
+    d_label[dt_map < (pixel_border_width / 2)] = ignore_value
+    return d_label.get(out=label_array)
+
+
 def process_single_raster_labels(
     gdf: gpd.GeoDataFrame,
     bounds: Tuple[float, float, float, float],  # (left, bottom, right, top)
@@ -24,6 +217,8 @@ def process_single_raster_labels(
     ignore_value: int,
     attr_column: Optional[str] = None,
     value_used_for_all_polygons: Optional[int] = None,
+    use_gpu: bool = False,
+    out: Optional[np.ndarray] = None,
 ) -> np.ndarray:
     """
     Core logic for generating a label array for a single raster file.
@@ -39,9 +234,11 @@ def process_single_raster_labels(
         ignore_value: Value for border/unknown regions
         attr_column: Name of the attribute column to use for polygon values (optional)
         value_used_for_all_polygons: If provided, all polygons get this value (optional)
+        use_gpu: Compute the border on the GPU with cupy/cuCIM (optional)
+        out: uint8 array of shape output_shape to write the labels into, e.g. a buffer reused between rasters (optional)
     
     Returns:
-        np.ndarray: The generated label array.
+        np.ndarray: The generated label array (out, if given).
     """
     # Validate inputs
     if value_used_for_all_polygons is not None and attr_column is not None:
@@ -59,34 +256,46 @@ def process_single_raster_labels(
         raise TypeError(
             f"attr_column must be a string, got {type(attr_column).__name__}: {attr_column}"
         )
+
+    if use_gpu and cupy is None:
+        raise ImportError("use_gpu requires cupy and cucim to be installed.")
     
     out_shape = output_shape
     
-    # Calculate mean_res from the transform
-    x_res = abs(out_transform.a)
-    y_res = abs(out_transform.e)
-    mean_res = (x_res + y_res) / 2
-    
-    pixel_border_width = unknown_border_size / mean_res
+    pixel_border_width = _pixel_border_width(unknown_border_size, out_transform)
 
     bbox = box(*bounds)
-    gdf_subset = gdf[gdf.geometry.intersects(bbox)].copy()
+    # The spatial index (STRtree) is built once per GeoDataFrame and reused for every raster.
+    # Indices are sorted to keep the original row order among the hits
+    hits = np.sort(gdf.sindex.query(bbox, predicate="intersects"))
+    gdf_subset = gdf.iloc[hits]
 
     fill_value = background_value if background_value is not None else ignore_value
 
+    # rasterize() only burns the shapes into a given out array, so it is filled with the background first
+    if out is None:
+        out = np.empty(out_shape, dtype=np.uint8)
+    out.fill(fill_value)
+
     if gdf_subset.empty:
         logging.info(f"No valid polygons intersect the raster extent. Creating an all-background label array.")
-        label_array = np.full(out_shape, fill_value, dtype=np.uint8)
+        label_array = out
     else:
-        # Sort by area descending to ensure smaller polygons are drawn over larger ones
-        if "area" not in gdf_subset.columns:
-            gdf_subset["area"] = gdf_subset.geometry.area
-        gdf_subset = gdf_subset.sort_values(by="area", ascending=False)
+        # Sort by area descending to ensure smaller polygons are drawn over larger ones.
+        # Only the geometry and value arrays are reordered, sorting the DataFrame would copy every column.
+        # The stable sort keeps the original row order among polygons of equal area
+        if "area" in gdf_subset.columns:
+            areas = gdf_subset["area"].to_numpy()
+        else:
+            areas = gdf_subset.geometry.area.to_numpy()
+        order = np.argsort(-areas, kind="stable")
         
-        # Create shapes list based on mode
+        # Create shapes based on mode. rasterize accepts any iterable of (geometry, value) pairs,
+        # so the geometry and value arrays are zipped lazily instead of building a list of tuples
+        geoms = gdf_subset.geometry.to_numpy()[order]
         if value_used_for_all_polygons is not None:
             # All polygons get the same value
-            shapes = [(geom, value_used_for_all_polygons) for geom in gdf_subset.geometry]
+            shapes = zip(geoms, itertools.repeat(value_used_for_all_polygons))
         else:
             # Use attribute column for values
             if attr_column not in gdf_subset.columns:
@@ -94,33 +303,203 @@ def process_single_raster_labels(
                     f"Attribute column '{attr_column}' not found in GeoDataFrame. "
                     f"Available columns: {list(gdf_subset.columns)}"
                 )
-            shapes = [(geom, value) for geom, value in zip(gdf_subset.geometry, gdf_subset[attr_column])]
+            values = gdf_subset[attr_column].to_numpy(dtype=np.uint8, copy=False)[order]
+            shapes = zip(geoms, values)
 
         label_array = rasterize(
             shapes=shapes,
-            out_shape=out_shape,
+            out=out,
             transform=out_transform,
             fill=fill_value,
-            dtype=np.uint8,
             all_touched=False,
         )
 
-        # Apply boundary mask
-        padded_labels = np.pad(label_array, 1, mode="edge")
-        diff_n = padded_labels[1:-1, 1:-1] != padded_labels[:-2, 1:-1]
-        diff_s = padded_labels[1:-1, 1:-1] != padded_labels[2:, 1:-1]
-        diff_w = padded_labels[1:-1, 1:-1] != padded_labels[1:-1, :-2]
-        diff_e = padded_labels[1:-1, 1:-1] != padded_labels[1:-1, 2:]
-
-        boundary_mask = diff_n | diff_s | diff_w | diff_e
-        dt_map = distance_transform_edt(np.invert(boundary_mask))
-        # Divide by 2 because the distance transform is from the *center* of the pixel
-        # to the boundary, and we want a border of width `pixel_border_width`.
-        border_mask = dt_map < (pixel_border_width/2)
-        label_array[border_mask] = ignore_value
+        if pixel_border_width <= 0:
+            # dt_map < pixel_border_width/2 can never be true, there is no border to mark
+            return label_array
+
+        if use_gpu:
+            return apply_border_gpu(label_array, pixel_border_width, ignore_value)
+
+        # Apply boundary mask. The mask is computed already inverted (0 on boundaries), it is fed to the distance transform as is
+        interior_mask = _scratch_buffer("interior_mask", out_shape, np.uint8)
+        _compute_interior(label_array, interior_mask)
+        # The 0/1 mask doubles as a bool array for the masks below
+        mask = interior_mask.view(np.bool_)
+        if pixel_border_width <= 2:
+            # Boundary pixels have distance 0 and all other pixels a distance of at least 1, so a border
+            # of at most 2 pixels (threshold <= 1) is exactly the boundary pixels: no distance transform needed
+            logging.info(f"Border of {pixel_border_width:.2f} pixels only covers the boundary pixels, skipping the distance transform.")
+            boundary_mask = np.logical_not(mask, out=mask)
+            label_array[boundary_mask] = ignore_value
+        else:
+            # Divide by 2 because the distance transform is from the *center* of the pixel
+            # to the boundary, and we want a border of width `pixel_border_width`.
+            threshold = pixel_border_width / 2
+            if threshold <= CHAMFER_MAX_DISTANCE:
+                # Narrow border: integer chamfer distances (uint16, 1/3 pixel units) and an integer compare,
+                # d < threshold * 3 is the same as d < ceil(threshold * 3) for integer d
+                dt_map = _scratch_buffer("dt_map_u16", out_shape, np.uint16)
+                _chamfer_distance_u16(interior_mask, dt_map)
+                threshold = np.uint16(math.ceil(threshold * CHAMFER_UNITS_PER_PIXEL))
+            else:
+                dt_map = distance_to_boundary(interior_mask, out=_scratch_buffer("dt_map", out_shape, np.float32))
+            # The interior mask is no longer needed, the border mask is written into it
+            border_mask = np.less(dt_map, threshold, out=mask)
+            label_array[border_mask] = ignore_value
     
     return label_array
 
+def read_geopackage_cached(geopackage: str) -> gpd.GeoDataFrame:
+    """
+    Read a GeoPackage through a GeoParquet copy next to it (geopackage + ".parquet").
+    The copy is written on the first read and used as long as it is newer than the GeoPackage.
+    Loading GeoParquet skips the SQLite parsing and per-feature geometry construction of gpd.read_file.
+    Falls back to gpd.read_file when pyarrow is not installed or the copy can not be read or written.
+    """
+    cache_path = geopackage + ".parquet"
+    try:
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) > os.path.getmtime(geopackage):
+            return gpd.read_parquet(cache_path)
+    except Exception as e:
+        logging.warning(f"Could not read GeoParquet cache {cache_path}, reading the GeoPackage instead: {e}")
+
+    gdf = gpd.read_file(geopackage)
+    # The copy is written to a temporary file in the same folder and then moved into place in one step,
+    # so an interrupted run or two runs at the same time never leave a truncated cache behind
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        gdf.to_parquet(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logging.warning(f"Could not write GeoParquet cache {cache_path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return gdf
+
+# State of a label worker process (or of the main process if there is a single worker), set by _set_label_state
+_worker_state = {}
+
+
+def _crs_key(crs) -> Optional[str]:
+    """WKT of a raster CRS, used as the key of the reprojected GeoDataFrames (None if the raster has no CRS)."""
+    return crs.to_wkt() if crs else None
+
+
+def _set_label_state(gdfs_by_crs: dict, settings: dict):
+    """
+    Store the polygons (one GeoDataFrame per raster CRS, see _crs_key) and the
+    process_single_raster_labels settings used by _process_tile in this process.
+    """
+    _worker_state["gdfs_by_crs"] = gdfs_by_crs
+    _worker_state["settings"] = settings
+    # Build the spatial indexes once per worker, they are used to find the polygons intersecting each raster
+    for gdf in gdfs_by_crs.values():
+        gdf.sindex
+
+
+def _init_label_worker(gdfs_by_crs: dict, settings: dict, threads: int, cache_mb: int):
+    """
+    Initializer of the label worker processes, see _set_label_state.
+    The numba kernels, OpenCV and GDAL of the worker are limited to its share of threads (see gdal_settings).
+    """
+    gdal_settings.init_worker(threads, cache_mb)
+    numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+    if cv2 is not None:
+        cv2.setNumThreads(threads)
+    _set_label_state(gdfs_by_crs, settings)
+
+
+def _process_tile(input_raster_path: Path, output_label_path):
+    """
+    Create the label image for a single raster and write it to output_label_path.
+    Large rasters are labelled window by window (see _label_windows). The windows overlap by more than
+    the border reaches, so boundaries just outside a window's core are still seen and there are no seams.
+    """
+    settings = _worker_state["settings"]
+    logging.info(f"Processing image: {input_raster_path.name}")
+
+    with rasterio.open(input_raster_path) as src:
+        
+        # Extract necessary metadata from src
+        out_transform = src.transform
+        gdf = _worker_state["gdfs_by_crs"][_crs_key(src.crs)]
+        overlap = math.ceil(_pixel_border_width(settings["unknown_border_size"], out_transform)) + 1
+        log_counts = logging.getLogger().isEnabledFor(logging.DEBUG)
+        counts = np.zeros(256, dtype=np.int64)
+        
+        # --- Write Output ---
+        profile = src.profile
+
+        # --- Remove conflicting metadata for single-band output ---
+        # Remove keys that are invalid for single-band label images (like YCBCR, JPEG compression)
+        for key in ['compress', 'photometric', 'interleave']:
+            if key in profile:
+                del profile[key]
+
+        # Update profile for the label file. Labels compress very well with LZW + horizontal differencing,
+        # 512x512 tiles line up with the label windows and GDAL compresses the tiles on all cpus
+        profile.update(
+            dtype=rasterio.uint8,
+            count=1,
+            nodata=settings["ignore_value"],
+            compress="lzw",
+            predictor=2,
+            tiled=True,
+            blockxsize=512,
+            blockysize=512,
+            num_threads=gdal_settings.worker_threads(),
+            bigtiff="IF_SAFER",
+        )
+
+        # A single writer thread compresses and writes window N while window N+1 is labelled (GDAL releases
+        # the GIL). Two label buffers are alternated so a window is never overwritten while it is being written
+        # GDAL_TIFF_INTERNAL_MASK keeps nodata/alpha masks inside the GeoTIFF instead of writing .msk sidecar files
+        with gdal_settings.worker_env(GDAL_TIFF_INTERNAL_MASK="TRUE"), rasterio.open(output_label_path, "w", **profile) as dst, \
+                ThreadPoolExecutor(max_workers=1) as writer:
+            pending_write = None
+            windows = _label_windows(src.height, src.width, LABEL_WINDOW_SIZE, overlap)
+            for window_index, (core_window, read_window) in enumerate(windows):
+                read_shape = (read_window.height, read_window.width)
+                # The label buffers are reused for the next windows and rasters
+                label_buffer = _scratch_buffer(f"label_buffer_{window_index % 2}", read_shape, np.uint8)
+
+                # --- Call the I/O-free core function ---
+                label_array = process_single_raster_labels(
+                    gdf=gdf,
+                    bounds=rasterio.windows.bounds(read_window, out_transform),
+                    output_shape=read_shape,
+                    out_transform=rasterio.windows.transform(read_window, out_transform),
+                    out=label_buffer,
+                    **settings,
+                )
+
+                # Only the core of the window is written, the overlap belongs to the neighbouring windows
+                row_start = core_window.row_off - read_window.row_off
+                col_start = core_window.col_off - read_window.col_off
+                core = label_array[row_start:row_start + core_window.height, col_start:col_start + core_window.width]
+                if log_counts:
+                    # bincount is a single linear pass over the uint8 labels, np.unique would sort them
+                    counts += np.bincount(core.ravel(), minlength=256)
+
+                # The previous write must be done before the next one is queued: the dataset is not
+                # thread-safe, and its buffer is the one the next window is labelled into
+                if pending_write is not None:
+                    pending_write.result()
+                pending_write = writer.submit(dst.write, core, 1, window=core_window)
+
+            if pending_write is not None:
+                pending_write.result()
+
+        if log_counts:
+            result = {int(value): int(counts[value]) for value in np.flatnonzero(counts)}
+            logging.debug(f"IDs present in label image and their counts: {result}")
+
+        logging.info(f"Successfully created label file: {output_label_path}")
+
+
 def process_label_generation_main(
     geopackage: str,
     input_folder: str,
@@ -130,6 +509,8 @@ def process_label_generation_main(
     background_value: int = 1,
     value_used_for_all_polygons: int = None,
     ignore_value: int = 0,
+    use_gpu: bool = False,
+    max_workers: Optional[int] = None,
 ):
     """
     Handles I/O: loads GeoPackage, finds rasters, calls the core processing function,
@@ -144,6 +525,8 @@ def process_label_generation_main(
         background_value: Value for background areas (default 1)
         value_used_for_all_polygons: If provided, all polygons get this value (optional)
         ignore_value: Value for border regions (default 0)
+        use_gpu: Compute the border on the GPU with cupy/cuCIM (default False)
+        max_workers: Number of processes used for the rasters (default os.cpu_count(), always 1 with use_gpu)
     """
     # Validate configuration
     if value_used_for_all_polygons is not None and attribute is not None:
@@ -163,13 +546,16 @@ def process_label_generation_main(
             f"cannot be equal to value_used_for_all_polygons ({value_used_for_all_polygons})."
         )
 
+    if use_gpu and cupy is None:
+        raise ImportError("use_gpu requires cupy and cucim to be installed.")
+
     logging.info(f"Starting label generation. Output folder: {output_folder}")
 
     # --- GeoPackage Loading ---
     if isinstance(geopackage, str):
         print("Loading geopackage...")
         reading_geopkg_start = time.time()
-        gdf = gpd.read_file(geopackage)
+        gdf = read_geopackage_cached(geopackage)
         print(f"Reading geopackage took: {(time.time()-reading_geopkg_start)/60:.2f} minutes")
     else:
         print("Using preloaded geopackage")
@@ -226,59 +612,55 @@ def process_label_generation_main(
         return gdf
 
     # --- Processing Loop ---
-    for input_raster_path_str in raster_files:
-        input_raster_path = Path(input_raster_path_str)
-        
-        if output_path_base is None:
-            # Single file case
-            output_label_path = output_folder
-        else:
-            # Batch case
-            output_label_path = output_path_base / input_raster_path.name
-            
-        logging.info(f"Processing image: {input_raster_path.name}")
+    # The rasters are independent, they are processed in parallel by a pool of worker processes.
+    # The GeoDataFrames are sent to each worker once (initializer), not once per raster
+    input_paths = [Path(input_raster_path_str) for input_raster_path_str in raster_files]
+    if output_path_base is None:
+        # Single file case
+        output_paths = [output_folder]
+    else:
+        # Batch case
+        output_paths = [output_path_base / input_raster_path.name for input_raster_path in input_paths]
 
+    # The polygons are reprojected to the CRS of the rasters, once per distinct CRS and not per raster.
+    # Rasters without a CRS, and polygons without one, are assumed to already match
+    gdfs_by_crs = {}
+    for input_raster_path in input_paths:
         with rasterio.open(input_raster_path) as src:
-            
-            # Extract necessary metadata from src
-            bounds = src.bounds
-            output_shape = (src.height, src.width)
-            out_transform = src.transform
-            
-            # --- Call the I/O-free core function ---
-            label_array = process_single_raster_labels(
-                gdf=gdf,
-                bounds=bounds,
-                output_shape=output_shape,
-                out_transform=out_transform,
-                unknown_border_size=unknown_border_size,
-                background_value=background_value,
-                ignore_value=ignore_value,
-                attr_column=attr_column,
-                value_used_for_all_polygons=value_used_for_all_polygons,
-            )
-            
-            # --- Write Output ---
-            profile = src.profile
-
-            # --- Remove conflicting metadata for single-band output ---
-            # Remove keys that are invalid for single-band label images (like YCBCR, JPEG compression)
-            for key in ['compress', 'photometric', 'interleave']:
-                if key in profile:
-                    del profile[key]
-
-            # Update profile for the label file
-            profile.update(dtype=rasterio.uint8, count=1, nodata=ignore_value)
-
-            unique, counts = np.unique(label_array, return_counts=True)
-            result = dict(zip(unique, counts))
-            print("IDs present in label image and their counts:")
-            print(result)
-
-            with rasterio.open(output_label_path, "w", **profile) as dst:
-                dst.write(label_array, 1)
+            crs_key = _crs_key(src.crs)
+        if crs_key in gdfs_by_crs:
+            continue
+        if crs_key is None or gdf.crs is None or gdf.crs == crs_key:
+            gdfs_by_crs[crs_key] = gdf
+        else:
+            logging.info(f"Reprojecting polygons from {gdf.crs} to the raster CRS {src.crs}")
+            gdfs_by_crs[crs_key] = gdf.to_crs(crs_key)
 
-            logging.info(f"Successfully created label file: {output_label_path}")
+    settings = dict(
+        unknown_border_size=unknown_border_size,
+        background_value=background_value,
+        ignore_value=ignore_value,
+        attr_column=attr_column,
+        value_used_for_all_polygons=value_used_for_all_polygons,
+        use_gpu=use_gpu,
+    )
+    max_workers = min(max_workers or os.cpu_count(), len(input_paths))
+    if use_gpu:
+        # Every process would create its own CUDA context on the same device, the GPU is shared by one process
+        max_workers = 1
+    if max_workers == 1:
+        # Runs in this process, which keeps its own GDAL, numba and OpenCV settings (the GDAL settings
+        # of the label files are scoped by worker_env in _process_tile)
+        _set_label_state(gdfs_by_crs, settings)
+        for input_raster_path, output_label_path in zip(input_paths, output_paths):
+            _process_tile(input_raster_path, output_label_path)
+    else:
+        # The workers run multi-threaded numba kernels and GDAL compression, each gets its share of the cpus
+        threads, cache_mb = gdal_settings.worker_resources(max_workers)
+        initargs = (gdfs_by_crs, settings, threads, cache_mb)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_label_worker, initargs=initargs) as executor:
+            # list() re-raises exceptions from the workers
+            list(executor.map(_process_tile, input_paths, output_paths))
             
     # Return the loaded geopackage to avoid reloading
     return gdf 
@@ -302,6 +684,8 @@ if __name__ == "__main__":
     parser.add_argument("--background_value", type=int, default=1, help="Background raster value before filling polygons. Default: 1.")
     parser.add_argument("--ignore_value", type=int, default=0, help="Value for the border/unknown region. Default: 0.")
     parser.add_argument("--value_used_for_all_polygons", type=int, help="Value for all polygons (ignores attribute column). Mutually exclusive with --attribute.")
+    parser.add_argument("--use_gpu", action="store_true", help="Compute the unknown border on the GPU (requires cupy and cucim).")
+    parser.add_argument("--workers", type=int, help="Number of processes used for the rasters. Default: number of cpus (1 with --use_gpu).")
 
     args = parser.parse_args()
 
@@ -314,5 +698,7 @@ if __name__ == "__main__":
         background_value=args.background_value,
         ignore_value=args.ignore_value,
         value_used_for_all_polygons=args.value_used_for_all_polygons,
+        use_gpu=args.use_gpu,
+        max_workers=args.workers,
     )
 
@@ -1,102 +1,237 @@
 import argparse
+import math
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import rasterio
-
-def process_images(folder, divide_by):
-    # Initialize variables to track statistics
-    max_max_val = float('-inf')
-    min_min_val = float('inf')
-    max_mean = float('-inf')
-    max_std = float('-inf')
-
-    sum_min_vals = 0
-    sum_max_vals = 0
-    sum_means = 0
-    sum_stds = 0
-    image_count = 0
-
-    # Loop through all files in the folder
-    for filename in os.listdir(folder):
-        filepath = os.path.join(folder, filename)
-
-        if not os.path.isfile(filepath):
+from numba import njit, prange
+from tqdm import tqdm
+import gdal_settings
+
+# Number of chunks _stats_parallel splits an array into
+PARALLEL_STATS_CHUNKS = 64
+
+# Pixel types the statistics kernels are compiled for when the module is imported (explicit signatures,
+# cached on disk), other types are converted to float64 first (see _kernel_input)
+STATS_DTYPES = ("u1", "u2", "i2", "i4", "u4", "f4", "f8")
+_STATS_SIGNATURES = [f"UniTuple(f8, 4)({dtype}[::1])" for dtype in STATS_DTYPES]
+_STATS_NUMPY_DTYPES = frozenset(np.dtype(dtype) for dtype in STATS_DTYPES)
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def _stats_range(a, lo, hi):
+    """
+    Min, max, mean and sum of squared deviations from the mean (M2) of a[lo:hi], in a single pass.
+    The sums are taken relative to the first value, which keeps M2 = sum(d**2) - sum(d)**2 / n accurate
+    for values far from 0.
+    """
+    shift = float(a[lo])
+    mn = a[lo]
+    mx = a[lo]
+    s = 0.0
+    s2 = 0.0
+    for i in range(lo, hi):
+        v = a[i]
+        if v < mn:
+            mn = v
+        if v > mx:
+            mx = v
+        d = v - shift
+        s += d
+        s2 += d * d
+    n = hi - lo
+    return float(mn), float(mx), shift + s / n, max(s2 - s * s / n, 0.0)
+
+
+@njit(cache=True, nogil=True)
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """
+    Count, mean and M2 of the union of two sets of values, from the count, mean and M2 of each
+    (the pairwise update of Chan et al.). Used for the chunks of _stats_parallel and the blocks of file_stats.
+    """
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n
+
+
+@njit(_STATS_SIGNATURES, cache=True, fastmath=True, nogil=True)
+def _stats(a):
+    """Min, max, mean and M2 of the 1-D array a, see _stats_range."""
+    return _stats_range(a, 0, a.size)
+
+
+@njit(_STATS_SIGNATURES, parallel=True, cache=True, fastmath=True, nogil=True)
+def _stats_parallel(a):
+    """
+    Same result as _stats, with the array split into PARALLEL_STATS_CHUNKS chunks that are reduced
+    in parallel. The chunk results are merged with _merge_moments.
+    """
+    n = a.size
+    n_chunks = min(n, PARALLEL_STATS_CHUNKS)
+    chunk_size = (n + n_chunks - 1) // n_chunks
+    mins = np.empty(n_chunks)
+    maxs = np.empty(n_chunks)
+    means = np.empty(n_chunks)
+    m2s = np.empty(n_chunks)
+    counts = np.zeros(n_chunks, dtype=np.int64)
+    for b in prange(n_chunks):
+        lo = b * chunk_size
+        hi = min(n, lo + chunk_size)
+        if hi > lo:
+            mins[b], maxs[b], means[b], m2s[b] = _stats_range(a, lo, hi)
+            counts[b] = hi - lo
+    # The first chunk is never empty
+    mn = mins[0]
+    mx = maxs[0]
+    mean = means[0]
+    m2 = m2s[0]
+    total = counts[0]
+    for b in range(1, n_chunks):
+        if counts[b] == 0:
             continue
+        mn = min(mn, mins[b])
+        mx = max(mx, maxs[b])
+        total, mean, m2 = _merge_moments(total, mean, m2, counts[b], means[b], m2s[b])
+    return mn, mx, mean, m2
+
+
+def _kernel_input(img_array):
+    """The pixels of img_array as a contiguous 1-D array of one of the STATS_DTYPES."""
+    flat = np.ascontiguousarray(img_array).ravel()
+    if flat.dtype not in _STATS_NUMPY_DTYPES:
+        flat = flat.astype(np.float64)
+    return flat
+
+
+def file_stats(filepath, parallel=False, threads=None):
+    """
+    Min, max, mean and std of the first band of an image file (each call opens its own dataset,
+    decoded by threads GDAL threads, default: all cpus).
+    The band is read block by block, so memory use does not depend on the image size. The per-block
+    mean and M2 are merged with _merge_moments.
+    The blocks are reduced with _stats_parallel if parallel, otherwise with _stats.
+    """
+    kernel = _stats_parallel if parallel else _stats
+    mn = math.inf
+    mx = -math.inf
+    n = 0
+    mean = 0.0
+    m2 = 0.0
+    with gdal_settings.worker_env(threads, GTIFF_DIRECT_IO="YES"), rasterio.open(filepath) as src:
+        for _, window in src.block_windows(1):
+            block = src.read(1, window=window)
+            if block.size == 0:
+                continue
+            block_min, block_max, block_mean, block_m2 = kernel(_kernel_input(block))
+            mn = min(mn, block_min)
+            mx = max(mx, block_max)
+            n, mean, m2 = _merge_moments(n, mean, m2, block.size, block_mean, block_m2)
+    if n == 0:
+        raise ValueError("image has no pixels")
+    return mn, mx, mean, math.sqrt(m2 / n)
+
+
+def process_images(folder, divide_by, verbose=False, quiet=False, parallel_stats=False):
+    """
+    Print the min, max, mean and std of the first band of every file in folder (divided by divide_by),
+    followed by their extremes and averages over all files.
+    The per-file lines are printed as the files are done if verbose, skipped if quiet and otherwise
+    printed together at the end, with a progress bar while the files are processed.
+    With parallel_stats the pixels of each image are reduced on all cpus (_stats_parallel) and the files
+    are processed one at a time, which is faster for a few large images.
+    Returns the per-file statistics as an array with one (min, max, mean, std) row per file,
+    the rows of files that could not be processed are NaN. Exits with an error if no file could be processed.
+    """
+    # scandir returns the file type with the directory listing, no extra stat call per file
+    with os.scandir(folder) as entries:
+        filenames = [entry.name for entry in entries if entry.is_file()]
+
+    # One row of statistics per file, the summary below is computed from the columns
+    stats = np.full((len(filenames), 4), np.nan)
+    valid = np.zeros(len(filenames), dtype=bool)
+
+    # Divide the statistics, not the data, by the specified value
+    # (dividing the data would allocate a float64 copy of the band)
+    scale = 1.0 / divide_by
+
+    # The per-file lines are collected (in file order) and written with a single write instead of one print per file
+    rows = [None] * len(filenames)
+
+    # The files are read and reduced by a pool of threads (GDAL decoding and the numba kernel release the GIL),
+    # each result is handled as soon as its file is done. The parallel kernel is already spread over all cpus,
+    # and numba's default threading layer does not allow parallel kernels to be called from several threads
+    max_workers = 1 if parallel_stats else min(32, os.cpu_count() * 2)
+    # The decoding threads are split between the reading threads
+    threads, _ = gdal_settings.worker_resources(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            tqdm(total=len(filenames), disable=verbose or quiet) as progress:
+        futures = {
+            executor.submit(file_stats, os.path.join(folder, filename), parallel=parallel_stats, threads=threads): index
+            for index, filename in enumerate(filenames)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            filename = filenames[index]
+            progress.update(1)
+            try:
+                raw_min, raw_max, raw_mean, raw_std = future.result()
+            except Exception as e:
+                tqdm.write(f"Error processing {filename}: {e}")
+                continue
+
+            img_min, img_max = sorted((raw_min * scale, raw_max * scale))
+            img_mean = raw_mean * scale
+            img_std = raw_std * abs(scale)
+            stats[index] = (img_min, img_max, img_mean, img_std)
+            valid[index] = True
+
+            row = f"{filename}: Min={img_min:.2f}, Max={img_max:.2f}, Mean={img_mean:.2f}, Std={img_std:.2f}"
+            if verbose:
+                print(row)
+            elif not quiet:
+                rows[index] = row
+
+    rows = [row for row in rows if row is not None]
+    if rows:
+        sys.stdout.write("\n".join(rows) + "\n")
 
-        try:
-            # Load the image with rasterio
-            with rasterio.open(filepath) as src:
-                img_array = src.read(1)  # Read the first band
-
-            # Divide data by the specified value
-            img_array = img_array / divide_by
-
-            # Calculate statistics
-            img_min = img_array.min()
-            img_max = img_array.max()
-            img_mean = img_array.mean()
-            img_std = img_array.std()
-
-            print(f"{filename}: Min={img_min:.2f}, Max={img_max:.2f}, Mean={img_mean:.2f}, Std={img_std:.2f}")
-
-            # Update extreme values
-            if img_max > max_max_val:
-                max_max_val = img_max
-            if img_min < min_min_val:
-                min_min_val = img_min
-            if img_mean > max_mean:
-                max_mean = img_mean
-            if img_std > max_std:
-                max_std = img_std
-
-            # Accumulate values for overall average
-            sum_min_vals += img_min
-            sum_max_vals += img_max
-            sum_means += img_mean
-            sum_stds += img_std
-
-            image_count += 1
-
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
-
-
-
-        avg_min_val = sum_min_vals / image_count
-        avg_max_val = sum_max_vals / image_count
-        avg_mean = sum_means / image_count
-        avg_std = sum_stds / image_count
-        print(f"Average Min Value: {avg_min_val:.2f}")
-        print(f"Average Max Value: {avg_max_val:.2f}")
-        print(f"Average Mean: {avg_mean:.2f}")
-        print(f"Average Std: {avg_std:.2f}")
     # Calculate and display final statistics
-    if image_count == 0:
+    if filenames and not valid.any():
+        # Every file failed (e.g. a broken GDAL setup), which is an error and not an empty folder
+        sys.exit(f"Error: none of the {len(filenames)} files in '{folder}' could be processed.")
+    if not valid.any():
         print("No valid images found in the folder.")
-        return
+        return stats
 
+    min_vals, max_vals, means, stds = stats[valid].T
     print("\n--- Final Statistics ---")
-    print(f"Maximum of Max Values: {max_max_val:.2f}")
-    print(f"Minimum of Min Values: {min_min_val:.2f}")
-    print(f"Maximum of Mean Values: {max_mean:.2f}")
-    print(f"Maximum of Std Values: {max_std:.2f}")
+    print(f"Maximum of Max Values: {max_vals.max():.2f}")
+    print(f"Minimum of Min Values: {min_vals.min():.2f}")
+    print(f"Maximum of Mean Values: {means.max():.2f}")
+    print(f"Maximum of Std Values: {stds.max():.2f}")
     print("\n--- Overall Averages ---")
-    print(f"Average Min Value: {avg_min_val:.2f}")
-    print(f"Average Max Value: {avg_max_val:.2f}")
-    print(f"Average Mean: {avg_mean:.2f}")
-    print(f"Average Std: {avg_std:.2f}")
+    print(f"Average Min Value: {min_vals.mean():.2f}")
+    print(f"Average Max Value: {max_vals.mean():.2f}")
+    print(f"Average Mean: {means.mean():.2f}")
+    print(f"Average Std: {stds.mean():.2f}")
+    return stats
 
 def main():
     parser = argparse.ArgumentParser(description="Compute image statistics in a folder using rasterio, with optional division.")
     parser.add_argument('--folder', type=str, required=True, help="Path to the folder containing images.")
     parser.add_argument('--divide_by', type=float, default =1.0, help="Value to divide all pixel data by before collecting statistics.")
+    parser.add_argument('--parallel_stats', action='store_true', help="Reduce the pixels of each image on all cpus and process the images one at a time (faster for a few large images).")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--verbose', action='store_true', help="Print the statistics of each image as soon as it is done (no progress bar).")
+    output.add_argument('--quiet', action='store_true', help="Only print the final statistics (no progress bar, no per-image statistics).")
     args = parser.parse_args()
 
     if not os.path.exists(args.folder):
         print(f"Error: Folder '{args.folder}' does not exist.")
         return
 
-    process_images(args.folder, args.divide_by)
+    process_images(args.folder, args.divide_by, verbose=args.verbose, quiet=args.quiet, parallel_stats=args.parallel_stats)
 
 if __name__ == "__main__":
     main()
@@ -1,24 +1,117 @@
 import argparse
-import configparser
+import copy
 import json
+import os
 import sys
 
+try:
+    # orjson parses JSON faster than the standard library, it is optional
+    import orjson
+except ImportError:
+    orjson = None
+
+# First characters a JSON value can start with (NaN and Infinity are accepted by json.loads as well).
+# Values starting with anything else are plain strings and are not given to the JSON parser
+_JSON_STARTS = frozenset('{["-0123456789tfnNI')
+
+if orjson is not None:
+    def _loads(value):
+        """
+        orjson.loads, falling back to json.loads for the values only the standard library accepts
+        (NaN, Infinity, integers above 64 bits).
+        """
+        try:
+            return orjson.loads(value)
+        except orjson.JSONDecodeError:
+            return json.loads(value)
+else:
+    _loads = json.loads
+
+# Parsed ini files, keyed on (absolute path, mtime in ns, size) so an edited file is parsed again
+_parse_cache = {}
+
 
 def parse(inifile_path):
-    config = configparser.ConfigParser()
-    config.read(inifile_path)
+    try:
+        st = os.stat(inifile_path)
+    except OSError:
+        # configparser skips files it can not open, which gives an empty result
+        return {}
+    cache_key = (os.path.abspath(inifile_path), st.st_mtime_ns, st.st_size)
+    if cache_key not in _parse_cache:
+        _parse_cache[cache_key] = _parse(inifile_path)
+    # The callers get their own copy, changes to it do not end up in the cache
+    return copy.deepcopy(_parse_cache[cache_key])
+
+
+def _read_items(inifile_path):
+    """
+    Yield the (section, key, value) triples of an ini file, in file order.
+    A small line scanner that follows configparser's rules for the files used here: keys are lowercased,
+    '=' or ':' separates key and value, lines starting with '#' or ';' are comments and indented lines
+    continue the value of the previous key. There is no interpolation.
+    """
+    section = None
+    key = None
+    value_lines = []
+    key_indent = 0
+    with open(inifile_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            stripped = line.strip()
+            indent = len(line) - len(line.lstrip())
+            if not stripped:
+                if key is not None:
+                    # Empty lines are part of a value if an indented continuation line follows
+                    value_lines.append("")
+                continue
+            if stripped[0] in "#;":
+                # Comment lines are left out, also inside a multi-line value
+                continue
+            if key is not None and indent > key_indent:
+                value_lines.append(stripped)
+                continue
+            if key is not None:
+                yield section, key, "\n".join(value_lines).strip()
+                key = None
+            if stripped[0] == "[" and stripped[-1] == "]":
+                section = stripped[1:-1]
+                continue
+            if section is None:
+                sys.exit(f"{inifile_path}, line {line_number}: key before the first [section] header.")
+            delimiter = min((i for i in (stripped.find("="), stripped.find(":")) if i >= 0), default=-1)
+            if delimiter <= 0:
+                sys.exit(f"{inifile_path}, line {line_number}: expected 'key = value', got {stripped!r}.")
+            key = stripped[:delimiter].rstrip().lower()
+            value_lines = [stripped[delimiter + 1:].strip()]
+            key_indent = indent
+    if key is not None:
+        yield section, key, "\n".join(value_lines).strip()
+
+
+def _parse(inifile_path):
+    # As in configparser, the keys of the DEFAULT section are part of every other section
+    defaults = {}
+    sections = {}
+    for section, key, value in _read_items(inifile_path):
+        items = defaults if section == "DEFAULT" else sections.setdefault(section, {})
+        if key in items:
+            sys.exit(f"Duplicate key '{key}' found in section '{section}'.")
+        items[key] = value
 
     result = {}
-    for section in config.sections():
-        for key, value in config.items(section):
+    for items in sections.values():
+        for key, value in {**defaults, **items}.items():
             if key in result:
                 sys.exit(f"Duplicate key '{key}' found in multiple sections.")
-            try:
-                result[key] = json.loads(value)
-            except json.JSONDecodeError as e:
-                #print("failed to json convert :"+str(value))
-                #print("making it into a string instead")
-                result[key] = str(value)
+            if value and value[0] in _JSON_STARTS:
+                try:
+                    result[key] = _loads(value)
+                    continue
+                except ValueError:
+                    #print("failed to json convert :"+str(value))
+                    #print("making it into a string instead")
+                    pass
+            result[key] = str(value)
     return result
 
 
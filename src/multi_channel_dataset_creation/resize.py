@@ -1,11 +1,22 @@
 import argparse
 import os
-import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import rasterio
 from rasterio.enums import Resampling
 from rasterio.transform import Affine
+from rasterio.warp import reproject
+import gdal_settings
 
-def resample_geotiff(input_path, output_path, resolution):
+
+def _resample_file(input_path, output_path, resolution):
+    print(f"Processing: {os.path.basename(input_path)}")
+    with gdal_settings.worker_env():
+        resample_geotiff(input_path, output_path, resolution, num_threads=gdal_settings.worker_threads())
+
+
+def resample_geotiff(input_path, output_path, resolution, num_threads=None):
+    num_threads = num_threads or os.cpu_count()
     with rasterio.open(input_path) as src:
         original_res = src.res  # (xres, yres)
         original_size = (src.width, src.height)
@@ -16,15 +27,12 @@ def resample_geotiff(input_path, output_path, resolution):
         scale_x = original_res[0] / resolution
         scale_y = original_res[1] / resolution
 
-        #if scale_x != 1.0:input(scale_x)
-
+        # Output grid with the same origin and exactly the requested pixel size (not derived from the scale
+        # factors, which would add rounding errors), truncated to whole pixels so it never reaches past the
+        # source bounds. The same grid is used for the output file and the warp
         new_width = int(src.width * scale_x)
         new_height = int(src.height * scale_y)
-
-        new_transform = Affine(
-            resolution, 0.0, src.bounds.left,
-            0.0, -resolution, src.bounds.top
-        )
+        new_transform = Affine(resolution, 0.0, src.transform.c, 0.0, -resolution, src.transform.f)
 
         kwargs = src.meta.copy()
         kwargs.update({
@@ -32,11 +40,34 @@ def resample_geotiff(input_path, output_path, resolution):
             'width': new_width,
             'transform': new_transform
         })
+        # Tiled + DEFLATE output, with horizontal differencing for integer and floating point predictor for float data
+        kwargs.update({
+            'tiled': True,
+            'blockxsize': 512,
+            'blockysize': 512,
+            'compress': 'deflate',
+            'predictor': 2 if np.issubdtype(np.dtype(src.dtypes[0]), np.integer) else 3,
+            'num_threads': num_threads,
+            'bigtiff': 'IF_SAFER',
+        })
 
+        # All bands are resampled by GDAL's warper, which works through the raster in chunks on all cpus
+        # and writes straight into the output file, instead of reading the resampled raster into memory
         with rasterio.open(output_path, 'w', **kwargs) as dst:
-            for i in range(1, src.count + 1):
-                data = src.read(i, out_shape=(new_height, new_width), resampling=Resampling.bilinear)
-                dst.write(data, i)
+            if src.crs is None:
+                # The warper needs a CRS, rasters without one are resampled with a (decimating) read
+                dst.write(src.read(out_shape=(src.count, new_height, new_width), resampling=Resampling.bilinear))
+            else:
+                reproject(
+                    source=rasterio.band(src, list(src.indexes)),
+                    destination=rasterio.band(dst, list(dst.indexes)),
+                    src_transform=src.transform,
+                    src_crs=src.crs,
+                    dst_transform=new_transform,
+                    dst_crs=src.crs,
+                    resampling=Resampling.bilinear,
+                    num_threads=num_threads,
+                )
 
         print(f"Resampled resolution: {resolution:.4f} x {resolution:.4f} meters/pixel")
         print(f"Resampled size: {new_width} x {new_height} pixels\n")
@@ -46,21 +77,33 @@ def main():
     parser.add_argument('--folder', required=True, help='Folder containing input GeoTIFFs')
     parser.add_argument('--output_folder', required=True, help='Folder to save resampled GeoTIFFs')
     parser.add_argument('--resolution', type=float, default=0.16, help='Target resolution in meters per pixel (default: 0.16)')
+    parser.add_argument('--workers', type=int, help='Number of processes used for the GeoTIFFs (default: number of cpus)')
 
     args = parser.parse_args()
 
     os.makedirs(args.output_folder, exist_ok=True)
 
-    tiffs = glob.glob(os.path.join(args.folder, '*.tif')) + glob.glob(os.path.join(args.folder, '*.tiff'))
+    # One directory listing for both suffixes (hidden files are skipped, like glob does)
+    with os.scandir(args.folder) as entries:
+        tiffs = [
+            entry.path for entry in entries
+            if entry.name.endswith(('.tif', '.tiff')) and not entry.name.startswith('.') and entry.is_file()
+        ]
     if not tiffs:
         print("No GeoTIFFs found in the input folder.")
         return
 
-    for tif in tiffs:
-        filename = os.path.basename(tif)
-        output_path = os.path.join(args.output_folder, filename)
-        print(f"Processing: {filename}")
-        resample_geotiff(tif, output_path, args.resolution)
+    # The GeoTIFFs are independent of each other and are resampled in parallel. The cpus and the GDAL cache
+    # are split between the worker processes
+    max_workers = min(args.workers or os.cpu_count(), len(tiffs))
+    threads, cache_mb = gdal_settings.worker_resources(max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=gdal_settings.init_worker, initargs=(threads, cache_mb)) as executor:
+        futures = [
+            executor.submit(_resample_file, tif, os.path.join(args.output_folder, os.path.basename(tif)), args.resolution)
+            for tif in tiffs
+        ]
+        for future in as_completed(futures):
+            future.result()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.transform import from_origin  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "multi_channel_dataset_creation"))
+
+import gdal_settings  # noqa: E402
+
+
+@pytest.fixture
+def tiny_geotiff(tmp_path):
+    path = str(tmp_path / "tiny.tif")
+    data = np.arange(64, dtype=np.uint8).reshape(8, 8)
+    profile = dict(driver="GTiff", width=8, height=8, count=1, dtype="uint8", crs="EPSG:25832", transform=from_origin(500000, 6200000, 0.1, 0.1))
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(data, 1)
+    return path, data
+
+
+@pytest.fixture
+def worker_state(monkeypatch):
+    """Undo init_worker after the test, and keep it from changing the config of the osgeo bindings in this process."""
+    monkeypatch.setattr(gdal_settings, "gdal", None)
+    monkeypatch.setattr(gdal_settings, "_worker_threads", gdal_settings._worker_threads)
+    monkeypatch.setattr(gdal_settings, "_worker_config", gdal_settings._worker_config)
+
+
+def test_worker_env_opens_geotiff(tiny_geotiff, worker_state):
+    path, data = tiny_geotiff
+    with gdal_settings.worker_env(), rasterio.open(path) as src:
+        assert np.array_equal(src.read(1), data)
+
+
+def test_worker_env_after_init_worker(tiny_geotiff, worker_state):
+    path, data = tiny_geotiff
+    threads, cache_mb = gdal_settings.worker_resources(4)
+    gdal_settings.init_worker(threads, cache_mb)
+    assert gdal_settings.worker_threads() == threads
+    with gdal_settings.worker_env(GTIFF_DIRECT_IO="YES"), rasterio.open(path) as src:
+        assert np.array_equal(src.read(1), data)
+
+
+def test_worker_env_is_scoped_without_init_worker(tiny_geotiff, worker_state):
+    from rasterio.env import get_gdal_config
+
+    path, _ = tiny_geotiff
+    cachemax = get_gdal_config("GDAL_CACHEMAX")
+    with gdal_settings.worker_env(threads=2), rasterio.open(path):
+        assert get_gdal_config("GDAL_DISABLE_READDIR_ON_OPEN") == "EMPTY_DIR"
+        assert get_gdal_config("GDAL_NUM_THREADS") == 2
+    assert get_gdal_config("GDAL_DISABLE_READDIR_ON_OPEN") is None
+    assert get_gdal_config("GDAL_NUM_THREADS") is None
+    assert get_gdal_config("GDAL_CACHEMAX") == cachemax
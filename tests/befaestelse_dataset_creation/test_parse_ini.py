@@ -0,0 +1,89 @@
+import configparser
+import glob
+import json
+import math
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "multi_channel_dataset_creation"))
+
+import parse_ini  # noqa: E402
+
+
+def configparser_parse(inifile_path):
+    """The configparser based parse() that parse_ini._read_items replaced, used as the reference."""
+    config = configparser.ConfigParser()
+    config.read(inifile_path)
+
+    result = {}
+    for section in config.sections():
+        for key, value in config.items(section):
+            if key in result:
+                sys.exit(f"Duplicate key '{key}' found in multiple sections.")
+            try:
+                result[key] = json.loads(value)
+            except ValueError:
+                result[key] = str(value)
+    return result
+
+
+def assert_same_result(path):
+    expected = configparser_parse(path)
+    parsed = parse_ini.parse(path)
+    assert list(parsed) == list(expected)
+    for key, value in expected.items():
+        if isinstance(value, float) and math.isnan(value):
+            assert math.isnan(parsed[key])
+        else:
+            assert parsed[key] == value
+            assert type(parsed[key]) is type(value)
+
+
+def write_ini(tmp_path, text):
+    path = tmp_path / "test.ini"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(REPO_ROOT, "configs", "*.ini"))))
+def test_configs_match_configparser(path):
+    assert_same_result(path)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # comment lines and empty lines inside a multi-line value
+        "[SETTINGS]\ndatatypes = [\"DSM\",\n#  \"DTM\",\n    \"rgb\"]\nnext = 1\n",
+        "[SETTINGS]\ndatatypes = [\"DSM\",\n    # \"DTM\",\n    ; \"cir\",\n\n    \"rgb\"]\nnext = 1\n",
+        "[SETTINGS]\nfolders = a\n    b\n\n\n    c\n\n#last\nnext = 1\n",
+        "[SETTINGS]\nfolders = a\n# b\n    c\n    ; d\n    e\n",
+        # DEFAULT keys are part of the other section, values in the section win
+        "[DEFAULT]\nsize = 1000\noverlap = 40\n[SETTINGS]\noverlap = 20\nname = x\n",
+        "[DEFAULT]\nsize = 1000\n",
+        # ':' as delimiter, upper case keys, empty values, values that are not JSON
+        "[SETTINGS]\nPath: a/b:c\nempty =\nflag = False\nnumber = 1e3\nnan = NaN\nlist = [1, 2.5, null]\n",
+        "# leading comment\n\n[A]\na = {\"x\": [1, 2]}\n[B]\nb = true\n",
+    ],
+)
+def test_edge_cases_match_configparser(tmp_path, text):
+    assert_same_result(write_ini(tmp_path, text))
+
+
+def test_duplicate_keys_exit(tmp_path):
+    path = write_ini(tmp_path, "[A]\nkey = 1\n[B]\nKEY = 2\n")
+    with pytest.raises(SystemExit):
+        configparser_parse(path)
+    with pytest.raises(SystemExit):
+        parse_ini.parse(path)
+
+
+def test_default_with_several_sections_exits(tmp_path):
+    path = write_ini(tmp_path, "[DEFAULT]\nsize = 1000\n[A]\na = 1\n[B]\nb = 2\n")
+    with pytest.raises(SystemExit):
+        configparser_parse(path)
+    with pytest.raises(SystemExit):
+        parse_ini.parse(path)
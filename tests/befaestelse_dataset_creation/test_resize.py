@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip("rasterio")
+from rasterio.enums import Resampling  # noqa: E402
+from rasterio.transform import from_origin  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src", "multi_channel_dataset_creation"))
+
+import resize  # noqa: E402
+
+
+def test_resize_cli_matches_decimating_read(tmp_path, monkeypatch):
+    input_folder = tmp_path / "input"
+    output_folder = tmp_path / "output"
+    input_folder.mkdir()
+    rows, cols = np.mgrid[0:200, 0:200]
+    data = np.stack([(np.sin(cols / 17) * 100 + 120), (rows + cols) % 200]).astype(np.uint8)
+    profile = dict(driver="GTiff", width=200, height=200, count=2, dtype="uint8", crs="EPSG:25832", transform=from_origin(500000, 6200000, 0.1, 0.1))
+    with rasterio.open(input_folder / "a.tif", "w", **profile) as dst:
+        dst.write(data)
+
+    monkeypatch.setattr(sys, "argv", ["resize.py", "--folder", str(input_folder), "--output_folder", str(output_folder), "--resolution", "0.16", "--workers", "1"])
+    resize.main()
+
+    # The 200 x 200 pixels at 0.1 m cover exactly 125 x 125 pixels at 0.16 m, where the
+    # warped output and a bilinear decimating read (what resize did before) sample the same grid
+    with rasterio.open(input_folder / "a.tif") as src:
+        expected = src.read(out_shape=(2, 125, 125), resampling=Resampling.bilinear)
+    with rasterio.open(output_folder / "a.tif") as dst:
+        assert (dst.width, dst.height, dst.count) == (125, 125, 2)
+        assert dst.crs == profile["crs"]
+        assert (dst.transform.c, dst.transform.f) == (500000, 6200000)
+        assert dst.res == (0.16, 0.16)
+        resampled = dst.read()
+    assert np.abs(resampled.astype(int) - expected.astype(int)).max() <= 1